@@ -11,17 +11,22 @@ Stack: Python + Streamlit + Gemini API (google-generativeai)
 
 from __future__ import annotations
 
+import asyncio
+import queue
+import threading
+from typing import Any, Dict, Tuple
+
 import streamlit as st
 
 # Import our modular components
 from utils import (
-    get_api_key, init_genai, create_model, 
-    get_current_context, DEFAULT_AUDIENCE
+    get_api_key, get_cached_model, run_async,
+    warm_gemini_connection, get_current_context, DEFAULT_AUDIENCE
 )
 from chain import (
-    step_brief_normalizer, step_market_intelligence, step_angle_generator,
-    step_idea_writer, step_critic_improve, step_compliance_check,
-    step_localize_polish, step_final_presenter
+    step_brief_normalizer, step_market_angles_async,
+    step_idea_writer_async, step_refine_all_async,
+    IdeaStreamScanner, present_idea
 )
 
 
@@ -30,6 +35,97 @@ from chain import (
 # -----------------------------
 
 
+async def run_pipeline(
+    model,
+    product: str,
+    description: str,
+    audience: str,
+    tone: str,
+    language: str,
+    status,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Run the chain through idea writing; returns (brief, ideas).
+
+    The fused refine pass is driven separately by stream_refined_markdown
+    so its output can render while still generating. Market analysis and
+    angle generation are fused into one call on the normalized brief
+    (step_market_angles_async), saving a round-trip without losing the
+    normalizer's typo fixes and audience enrichment. The normalizer goes
+    through the st.cache_data-backed sync call (identical inputs skip the
+    API); the creative steps stay uncached so regenerating can produce
+    new variations, and their responses are streamed with the status
+    label ticking as chunks arrive.
+    """
+    def progress(label: str):
+        status.update(label=label)
+
+        def on_chunk(received: int) -> None:
+            status.update(label=f"{label} ({received:,} chars)")
+
+        return on_chunk
+
+    status.update(label="Normalizing brief...")
+    brief = await asyncio.to_thread(
+        step_brief_normalizer, model, product, description, audience, tone, language
+    )
+
+    market_angles = await step_market_angles_async(
+        model, brief,
+        on_chunk=progress("Analyzing KSA market and generating creative angles..."),
+    )
+    angles = {"angles": market_angles.get("angles", [])}
+
+    ideas = await step_idea_writer_async(
+        model, brief, angles, on_chunk=progress("Writing campaign ideas...")
+    )
+
+    return brief, ideas
+
+
+def stream_refined_markdown(model, brief: Dict[str, Any], ideas: Dict[str, Any]):
+    """Generator for st.write_stream that renders the refine step live.
+
+    Runs the fused critique/compliance/localize call on a worker thread and
+    yields each idea's markdown the moment its JSON object closes in the
+    response stream, so Option A paints while the model is still writing B
+    and C. Any idea the incremental scan missed is yielded from the parsed
+    result at the end; worker errors re-raise here so the caller's error
+    handling sees them.
+    """
+    sections: "queue.Queue" = queue.Queue()
+    state: Dict[str, Any] = {"yielded": 0, "result": None, "error": None}
+    scanner = IdeaStreamScanner()
+
+    def on_text(chunk: str) -> None:
+        for idea in scanner.feed(chunk):
+            prefix = "" if state["yielded"] == 0 else "\n\n"
+            sections.put(prefix + present_idea(idea))
+            state["yielded"] += 1
+
+    def worker() -> None:
+        try:
+            state["result"] = run_async(
+                step_refine_all_async(model, brief, ideas, on_text=on_text)
+            )
+        except Exception as exc:
+            state["error"] = exc
+        finally:
+            sections.put(None)
+
+    threading.Thread(target=worker, daemon=True).start()
+    while True:
+        section = sections.get()
+        if section is None:
+            break
+        yield section
+    if state["error"] is not None:
+        raise state["error"]
+
+    final_ideas = (state["result"] or {}).get("ideas", [])
+    for idea in final_ideas[state["yielded"]:]:
+        prefix = "" if state["yielded"] == 0 else "\n\n"
+        state["yielded"] += 1
+        yield prefix + present_idea(idea)
 
 
 def main() -> None:
@@ -41,6 +137,12 @@ def main() -> None:
     current_context = get_current_context()
     st.info(f"📅 {current_context['context_note']} | Current events: {', '.join(current_context['cultural_events'])}")
 
+    # Warm the API connection in the background while the user fills in the
+    # form, so the first chain call does not pay DNS/TCP/TLS setup.
+    api_key = get_api_key()
+    if api_key:
+        warm_gemini_connection(api_key)
+
     with st.form("creative_form", clear_on_submit=False):
         product = st.text_input("Product", placeholder="e.g., Cycls Smart Bottle")
         description = st.text_area(
@@ -60,45 +162,27 @@ def main() -> None:
             final_audience = DEFAULT_AUDIENCE
         # ---------------------------------------------------------
 
-        api_key = get_api_key()
         if not api_key:
             st.error("Missing API key. Please set GEMINI_API_KEY/GOOGLE_API_KEY in Secrets or env.")
             st.stop()
 
-        init_genai(api_key)
-        model = create_model(model_name="gemini-1.5-flash")
+        model = get_cached_model(api_key, "gemini-1.5-flash", current_context["current_date"])
 
         try:
-            with st.spinner("Normalizing brief..."):
-                brief = step_brief_normalizer(
-                    model, product, description, final_audience, tone, language
+            status = st.status("Running creative chain...", expanded=False)
+            brief, ideas = run_async(
+                run_pipeline(
+                    model, product, description, final_audience, tone, language, status
                 )
+            )
 
-            with st.spinner("Analyzing KSA market intelligence..."):
-                market_insights = step_market_intelligence(model, brief)
-
-            with st.spinner("Generating culturally-informed creative angles..."):
-                angles = step_angle_generator(model, brief, market_insights)
-
-            with st.spinner("Writing campaign ideas..."):
-                ideas = step_idea_writer(model, brief, angles)
-
-            with st.spinner("Critiquing and improving ideas..."):
-                improved = step_critic_improve(model, brief, ideas)
-
-            with st.spinner("Checking compliance and cultural guidelines..."):
-                compliant = step_compliance_check(model, brief, improved)
-
-            with st.spinner("Localizing and polishing..."):
-                localized = step_localize_polish(model, brief, compliant)
-
-            final_ideas = localized.get("ideas", [])
-            if not isinstance(final_ideas, list) or len(final_ideas) == 0:
+            status.update(label="Critiquing, checking compliance, and localizing...")
+            markdown = st.write_stream(stream_refined_markdown(model, brief, ideas))
+            if not str(markdown).strip():
+                status.update(label="No ideas returned", state="error")
                 st.error("The model returned no ideas. Please try again.")
                 st.stop()
-
-            markdown = step_final_presenter(final_ideas)
-            st.markdown(markdown)
+            status.update(label="Done", state="complete")
 
         except Exception as e:
             st.error(f"Generation failed: {e}")
@@ -1,22 +1,425 @@
 """
 Chain step functions for Creative Agent
 All AI chain processing steps in one module
+
+Each step has a private prompt builder shared by a sync wrapper (kept for
+backwards compatibility) and an async wrapper, so independent steps can run
+concurrently with asyncio.gather. The static text of every prompt is built
+once at import time as immutable head/tail template constants; builders only
+splice the per-run payload between them.
 """
 import json
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, TypedDict
 
-from utils import get_current_context, call_gemini_json
+from utils import (
+    get_current_context,
+    call_gemini_json,
+    call_gemini_json_cached,
+    call_gemini_json_async,
+)
 
 
-def step_brief_normalizer(
-    model,
+# -----------------------------
+# Response schemas
+# -----------------------------
+
+# TypedDicts passed to Gemini as response_schema: the API constrains decoding
+# to the declared shape, so responses are valid JSON by construction and the
+# defensive extraction in parse_json_str is skipped entirely.
+
+
+class Brief(TypedDict):
+    product: str
+    description: str
+    audience: str
+    tone: str
+    language: str
+    objectives: List[str]
+    constraints: List[str]
+
+
+class MarketInsightCategories(TypedDict):
+    cultural_moments: List[str]
+    local_trends: List[str]
+    target_behaviors: List[str]
+    competitive_landscape: List[str]
+    opportunities: List[str]
+    seasonal_relevance: List[str]
+
+
+class MarketIntelligence(TypedDict):
+    market_insights: MarketInsightCategories
+
+
+class Angle(TypedDict):
+    id: str
+    title: str
+    insight: str
+    key_message: str
+    cultural_hook: str
+    timing_consideration: str
+
+
+class AngleSet(TypedDict):
+    angles: List[Angle]
+
+
+class MarketAngles(TypedDict):
+    market_insights: MarketInsightCategories
+    angles: List[Angle]
+
+
+class Captions(TypedDict):
+    instagram: str
+    x: str
+
+
+class Idea(TypedDict):
+    label: str
+    based_on_angle_id: str
+    tagline: str
+    script_30s: str
+    captions: Captions
+    cta: str
+
+
+class IdeaSet(TypedDict):
+    ideas: List[Idea]
+
+
+class ReviewedIdea(Idea):
+    compliance_notes: str
+
+
+class ReviewedIdeaSet(TypedDict):
+    ideas: List[ReviewedIdea]
+
+
+# -----------------------------
+# Prompt templates and fragments
+# -----------------------------
+
+# Serialized payload fragments, keyed by fragment name. The brief and context
+# dicts are passed unchanged to most steps, so each is json.dumps'd once per
+# run (identity-checked) and the builders splice the cached string into the
+# payload with f-strings instead of re-serializing the whole payload per call.
+_FRAGMENT_MEMO: Dict[str, Any] = {}
+
+
+def _fragment(kind: str, obj: Any) -> str:
+    prev = _FRAGMENT_MEMO.get(kind)
+    if prev is None or prev[0] is not obj:
+        prev = (obj, json.dumps(obj, ensure_ascii=False))
+        _FRAGMENT_MEMO[kind] = prev
+    return prev[1]
+
+
+def _slim_brief(brief: Dict[str, Any]) -> str:
+    """Serialized audience/tone/language subset of the brief.
+
+    The idea writer and refine pass read only these three fields — the
+    angles already carry the product facts forward — so re-sending the
+    description, objectives, and constraints on every later call would be
+    wasted input tokens. Memoized like the other fragments.
+    """
+    prev = _FRAGMENT_MEMO.get("slim_brief")
+    if prev is None or prev[0] is not brief:
+        slim = {k: brief.get(k, "") for k in ("audience", "tone", "language")}
+        prev = (brief, json.dumps(slim, ensure_ascii=False))
+        _FRAGMENT_MEMO["slim_brief"] = prev
+    return prev[1]
+
+
+_BRIEF_HEAD = (
+    "Role: Brief Normalizer\n"
+    "Task: Given a raw brief, produce a clean, standardized JSON object that will be passed to other steps.\n"
+    "Input JSON:\n"
+)
+_BRIEF_TAIL = (
+    "\nOutput JSON schema (no additional fields):\n"
+    "{\n"
+    "  \"product\": string,\n"
+    "  \"description\": string,\n"
+    "  \"audience\": string,\n"
+    "  \"tone\": string,\n"
+    "  \"language\": \"English\" | \"Arabic\",\n"
+    "  \"objectives\": string[],\n"
+    "  \"constraints\": string[]\n"
+    "}\n"
+    "Rules:\n"
+    "- The default target market is Riyadh, Saudi Arabia (KSA). If the input audience is generic or empty, enrich it with this specific context.\n"
+    "- Correct typos and normalize while preserving meaning.\n"
+    "- Use concise phrasing.\n"
+    "- Do not include nulls; use [] for empty arrays.\n"
+    "- Respond ONLY with minified JSON."
+)
+
+_MARKET_HEAD = (
+    "Role: Market Intelligence Analyst\n"
+    "Task: Analyze the KSA market context and provide strategic insights for the campaign brief.\n"
+)
+_MARKET_TAIL = (
+    "\nOutput JSON schema:\n"
+    "{\n"
+    "  \"market_insights\": {\n"
+    "    \"cultural_moments\": string[],\n"
+    "    \"local_trends\": string[],\n"
+    "    \"target_behaviors\": string[],\n"
+    "    \"competitive_landscape\": string[],\n"
+    "    \"opportunities\": string[],\n"
+    "    \"seasonal_relevance\": string[]\n"
+    "  }\n"
+    "}\n"
+    "Rules:\n"
+    "- Use the current date and season provided to give timely, relevant insights.\n"
+    "- Focus on Riyadh/KSA market specifically unless different location specified.\n"
+    "- Consider current season, weather, cultural events happening NOW.\n"
+    "- Include seasonal shopping patterns, behavioral changes, cultural moments.\n"
+    "- Identify 3-5 items per category.\n"
+    "- Respond ONLY with minified JSON."
+)
+
+_ANGLE_HEAD = (
+    "Role: Creative Strategist\n"
+    "Task: Using the brief and market insights, propose exactly 5 distinct creative angles for ad campaigns.\n"
+)
+_ANGLE_TAIL = (
+    "\nOutput JSON schema (exactly 5):\n"
+    "{\n"
+    "  \"angles\": [\n"
+    "    {\n"
+    "      \"id\": \"1\"..\"5\",\n"
+    "      \"title\": string,\n"
+    "      \"insight\": string,\n"
+    "      \"key_message\": string,\n"
+    "      \"cultural_hook\": string,\n"
+    "      \"timing_consideration\": string\n"
+    "    }\n"
+    "  ]\n"
+    "}\n"
+    "Rules:\n"
+    "- Use the current date/season to create timely, relevant angles.\n"
+    "- Leverage market insights to create culturally resonant angles for Riyadh/KSA.\n"
+    "- Each angle must tap into what's happening NOW - current season, events, behaviors.\n"
+    "- Consider immediate timing opportunities (current weather, seasonal activities, cultural moments).\n"
+    "- Angles must be distinct and non-overlapping.\n"
+    "- Tailor to the audience and tone.\n"
+    "- Respond ONLY with minified JSON."
+)
+
+_MARKET_ANGLES_HEAD = (
+    "Role: Market Intelligence Analyst & Creative Strategist\n"
+    "Task: In one pass, analyze the KSA market context for the campaign brief, then use those insights to propose exactly 5 distinct creative angles for ad campaigns.\n"
+)
+_MARKET_ANGLES_TAIL = (
+    "\nOutput JSON schema (exactly 5 angles):\n"
+    "{\n"
+    "  \"market_insights\": {\n"
+    "    \"cultural_moments\": string[],\n"
+    "    \"local_trends\": string[],\n"
+    "    \"target_behaviors\": string[],\n"
+    "    \"competitive_landscape\": string[],\n"
+    "    \"opportunities\": string[],\n"
+    "    \"seasonal_relevance\": string[]\n"
+    "  },\n"
+    "  \"angles\": [\n"
+    "    {\n"
+    "      \"id\": \"1\"..\"5\",\n"
+    "      \"title\": string,\n"
+    "      \"insight\": string,\n"
+    "      \"key_message\": string,\n"
+    "      \"cultural_hook\": string,\n"
+    "      \"timing_consideration\": string\n"
+    "    }\n"
+    "  ]\n"
+    "}\n"
+    "Rules:\n"
+    "- Use the current date and season provided to give timely, relevant insights and angles.\n"
+    "- Focus on Riyadh/KSA market specifically unless different location specified.\n"
+    "- Consider current season, weather, cultural events happening NOW.\n"
+    "- Include seasonal shopping patterns, behavioral changes, cultural moments.\n"
+    "- Identify 3-5 items per insight category.\n"
+    "- Ground each angle in the market insights to make it culturally resonant.\n"
+    "- Each angle must tap into what's happening NOW - current season, events, behaviors.\n"
+    "- Angles must be distinct and non-overlapping.\n"
+    "- Tailor to the audience and tone.\n"
+    "- Respond ONLY with minified JSON."
+)
+
+_IDEA_HEAD = (
+    "Role: Idea Writer\n"
+    "Task: Using the brief and angles, write exactly 3 campaign ideas (A, B, C) with required fields.\n"
+    "Input JSON:\n"
+)
+_IDEA_TAIL = (
+    "\nOutput JSON schema (exactly 3):\n"
+    "{\n"
+    "  \"ideas\": [\n"
+    "    {\n"
+    "      \"label\": \"A\"|\"B\"|\"C\",\n"
+    "      \"based_on_angle_id\": \"1\"..\"5\",\n"
+    "      \"tagline\": string,\n"
+    "      \"script_30s\": string,\n"
+    "      \"captions\": { \"instagram\": string, \"x\": string },\n"
+    "      \"cta\": string\n"
+    "    }\n"
+    "  ]\n"
+    "}\n"
+    "Constraints:\n"
+    "- Scripts and captions must be culturally and locally relevant for the Riyadh, Saudi Arabia (KSA) market unless a different audience is specified.\n"
+    "- Longer narrative: ~130–170 words (about 40s), with a clear beginning, middle, and end.\n"
+    "- Captions are punchy; no hashtags unless essential.\n"
+    "- Align with tone and audience.\n"
+    "- Respond ONLY with minified JSON."
+)
+
+_CRITIC_HEAD = (
+    "Role: Critic & Improve\n"
+    "Task: Review the ideas, identify weaknesses, and revise them. Output only the improved versions.\n"
+    "Input JSON:\n"
+)
+_CRITIC_TAIL = (
+    "\nOutput JSON schema:\n"
+    "{\n"
+    "  \"ideas\": [\n"
+    "    {\n"
+    "      \"label\": \"A\"|\"B\"|\"C\",\n"
+    "      \"based_on_angle_id\": \"1\"..\"5\",\n"
+    "      \"tagline\": string,\n"
+    "      \"script_30s\": string,\n"
+    "      \"captions\": { \"instagram\": string, \"x\": string },\n"
+    "      \"cta\": string\n"
+    "    }\n"
+    "  ]\n"
+    "}\n"
+    "Rules:\n"
+    "- Review for cultural appropriateness for the Riyadh/KSA market. Revise any idea that might not land well.\n"
+    "- Keep original strengths; fix clarity, hook, and CTA strength.\n"
+    "- Ensure each idea is distinct; remove redundancy.\n"
+    "- Respond ONLY with minified JSON."
+)
+
+_COMPLIANCE_HEAD = (
+    "Role: Compliance & Cultural Reviewer\n"
+    "Task: Review campaign ideas for compliance with KSA advertising guidelines and cultural appropriateness.\n"
+    "Input JSON:\n"
+)
+_COMPLIANCE_TAIL = (
+    "\nOutput JSON schema:\n"
+    "{\n"
+    "  \"ideas\": [\n"
+    "    {\n"
+    "      \"label\": \"A\"|\"B\"|\"C\",\n"
+    "      \"based_on_angle_id\": \"1\"..\"5\",\n"
+    "      \"tagline\": string,\n"
+    "      \"script_30s\": string,\n"
+    "      \"captions\": { \"instagram\": string, \"x\": string },\n"
+    "      \"cta\": string,\n"
+    "      \"compliance_notes\": string\n"
+    "    }\n"
+    "  ]\n"
+    "}\n"
+    "Rules:\n"
+    "- Ensure compliance with Saudi Arabia advertising regulations and cultural sensitivities.\n"
+    "- Check for appropriate representation, modest imagery suggestions, respectful tone.\n"
+    "- Verify timing considerations (prayer times, cultural events, weekends).\n"
+    "- Remove or revise any potentially problematic content.\n"
+    "- Add brief compliance notes explaining any changes made.\n"
+    "- Respond ONLY with minified JSON."
+)
+
+_LOCALIZE_HEAD = (
+    "Role: Localize/Polish\n"
+    "Task: Refine the ideas to the requested language and tone. If the language is Arabic, fully localize the content to natural Modern Standard Arabic. If the language is English, just polish the existing English text for clarity and impact.\n"
+    "Style Guide (apply strictly):\n"
+    "- Use a friendly, conversational second-person voice (\"you\").\n"
+    "- Prefer short sentences (8–15 words) and simple everyday words.\n"
+    "- Open scripts with a concrete moment or scenario (e.g., \"Imagine...\", \"It's 2 PM in Riyadh...\").\n"
+    "- Show, not tell: add 1–2 light sensory cues without hype.\n"
+    "- Keep scripts ~120–160 words, split into 3–5 short paragraphs.\n"
+    "- Captions: IG slightly expressive; X concise and punchy. Avoid unnecessary hashtags.\n"
+    "- Do not invent product claims; no health/functional promises.\n"
+    "Input JSON:\n"
+)
+_LOCALIZE_TAIL = (
+    "\nOutput JSON schema (same as input ideas schema):\n"
+    "{\n"
+    "  \"ideas\": [\n"
+    "    {\n"
+    "      \"label\": \"A\"|\"B\"|\"C\",\n"
+    "      \"based_on_angle_id\": \"1\"..\"5\",\n"
+    "      \"tagline\": string,\n"
+    "      \"script_30s\": string,\n"
+    "      \"captions\": { \"instagram\": string, \"x\": string },\n"
+    "      \"cta\": string\n"
+    "    }\n"
+    "  ]\n"
+    "}\n"
+    "Rules:\n"
+    "- Perform a final cultural polish to ensure content is appropriate and effective for the target market (defaulting to Riyadh, KSA).\n"
+    "- Preserve meaning while adjusting tone.\n"
+    "- For Arabic, use proper Modern Standard Arabic, not transliteration.\n"
+    "- For English, focus on polishing grammar, style, and flow.\n"
+    "- Respond ONLY with minified JSON."
+)
+
+_REFINE_HEAD = (
+    "Role: Creative Reviewer (Critique + Compliance + Localize)\n"
+    "Task: In one pass, critique and improve the ideas, check them for KSA compliance, and localize/polish to the requested language and tone.\n"
+    "1) Critique & Improve:\n"
+    "- Review for cultural appropriateness for the Riyadh/KSA market. Revise any idea that might not land well.\n"
+    "- Keep original strengths; fix clarity, hook, and CTA strength.\n"
+    "- Ensure each idea is distinct; remove redundancy.\n"
+    "2) Compliance:\n"
+    "- Ensure compliance with Saudi Arabia advertising regulations and cultural sensitivities.\n"
+    "- Check for appropriate representation, modest imagery suggestions, respectful tone.\n"
+    "- Verify timing considerations (prayer times, cultural events, weekends).\n"
+    "- Remove or revise any potentially problematic content.\n"
+    "- Add brief compliance notes explaining any changes made.\n"
+    "3) Localize/Polish:\n"
+    "- If the language is Arabic, fully localize to natural Modern Standard Arabic; if English, polish for clarity and impact.\n"
+    "- Use a friendly, conversational second-person voice (\"you\").\n"
+    "- Prefer short sentences (8–15 words) and simple everyday words.\n"
+    "- Open scripts with a concrete moment or scenario (e.g., \"Imagine...\", \"It's 2 PM in Riyadh...\").\n"
+    "- Show, not tell: add 1–2 light sensory cues without hype.\n"
+    "- Keep scripts ~120–160 words, split into 3–5 short paragraphs.\n"
+    "- Captions: IG slightly expressive; X concise and punchy. Avoid unnecessary hashtags.\n"
+    "- Do not invent product claims; no health/functional promises.\n"
+    "Input JSON:\n"
+)
+_REFINE_TAIL = (
+    "\nOutput JSON schema:\n"
+    "{\n"
+    "  \"ideas\": [\n"
+    "    {\n"
+    "      \"label\": \"A\"|\"B\"|\"C\",\n"
+    "      \"based_on_angle_id\": \"1\"..\"5\",\n"
+    "      \"tagline\": string,\n"
+    "      \"script_30s\": string,\n"
+    "      \"captions\": { \"instagram\": string, \"x\": string },\n"
+    "      \"cta\": string,\n"
+    "      \"compliance_notes\": string\n"
+    "    }\n"
+    "  ]\n"
+    "}\n"
+    "Rules:\n"
+    "- Apply all three passes in order; the output reflects the final localized version.\n"
+    "- Respond ONLY with minified JSON."
+)
+
+
+# -----------------------------
+# Prompt builders
+# -----------------------------
+
+
+def _brief_normalizer_prompt(
     product: str,
     description: str,
     audience: str,
     tone: str,
     language: str,
-) -> Dict[str, Any]:
-    """Step 1 – Normalize raw user inputs into a clean brief JSON."""
+) -> str:
     raw_input = {
         "product": product,
         "description": description,
@@ -24,97 +427,138 @@ def step_brief_normalizer(
         "tone": tone,
         "language": language,
     }
+    return _BRIEF_HEAD + json.dumps(raw_input, ensure_ascii=False) + _BRIEF_TAIL
+
 
-    prompt = (
-        "Role: Brief Normalizer\n"
-        "Task: Given a raw brief, produce a clean, standardized JSON object that will be passed to other steps.\n"
-        "Input JSON:\n"
-        f"{json.dumps(raw_input, ensure_ascii=False)}\n"
-        "Output JSON schema (no additional fields):\n"
-        "{\n"
-        "  \"product\": string,\n"
-        "  \"description\": string,\n"
-        "  \"audience\": string,\n"
-        "  \"tone\": string,\n"
-        "  \"language\": \"English\" | \"Arabic\",\n"
-        "  \"objectives\": string[],\n"
-        "  \"constraints\": string[]\n"
-        "}\n"
-        "Rules:\n"
-        "- The default target market is Riyadh, Saudi Arabia (KSA). If the input audience is generic or empty, enrich it with this specific context.\n"
-        "- Correct typos and normalize while preserving meaning.\n"
-        "- Use concise phrasing.\n"
-        "- Do not include nulls; use [] for empty arrays.\n"
-        "- Respond ONLY with minified JSON."
+def _market_intelligence_prompt(brief: Dict[str, Any]) -> str:
+    current_context = get_current_context()
+    payload_json = (
+        f'{{"brief":{_fragment("brief", brief)},'
+        f'"current_context":{_fragment("context", current_context)}}}'
+    )
+    return (
+        _MARKET_HEAD
+        + f"IMPORTANT: Today is {current_context['context_note']}. Current cultural events: {', '.join(current_context['cultural_events'])}.\n"
+        + "Input JSON:\n"
+        + payload_json
+        + _MARKET_TAIL
     )
-    return call_gemini_json(model, prompt, temperature=0.4)
 
 
-def step_market_intelligence(model, brief: Dict[str, Any]) -> Dict[str, Any]:
-    """Step 2 – Generate KSA market insights and competitive landscape."""
+def _angle_generator_prompt(brief: Dict[str, Any], market_insights: Dict[str, Any]) -> str:
     current_context = get_current_context()
-    payload = {"brief": brief, "current_context": current_context}
-    prompt = (
-        "Role: Market Intelligence Analyst\n"
-        "Task: Analyze the KSA market context and provide strategic insights for the campaign brief.\n"
-        f"IMPORTANT: Today is {current_context['context_note']}. Current cultural events: {', '.join(current_context['cultural_events'])}.\n"
-        "Input JSON:\n"
-        f"{json.dumps(payload, ensure_ascii=False)}\n"
-        "Output JSON schema:\n"
-        "{\n"
-        "  \"market_insights\": {\n"
-        "    \"cultural_moments\": string[],\n"
-        "    \"local_trends\": string[],\n"
-        "    \"target_behaviors\": string[],\n"
-        "    \"competitive_landscape\": string[],\n"
-        "    \"opportunities\": string[],\n"
-        "    \"seasonal_relevance\": string[]\n"
-        "  }\n"
-        "}\n"
-        "Rules:\n"
-        "- Use the current date and season provided to give timely, relevant insights.\n"
-        "- Focus on Riyadh/KSA market specifically unless different location specified.\n"
-        "- Consider current season, weather, cultural events happening NOW.\n"
-        "- Include seasonal shopping patterns, behavioral changes, cultural moments.\n"
-        "- Identify 3-5 items per category.\n"
-        "- Respond ONLY with minified JSON."
+    payload_json = (
+        f'{{"brief":{_fragment("brief", brief)},'
+        f'"market_insights":{_fragment("market_insights", market_insights.get("market_insights", {}))},'
+        f'"current_context":{_fragment("context", current_context)}}}'
+    )
+    return (
+        _ANGLE_HEAD
+        + f"CURRENT TIMING CONTEXT: {current_context['context_note']}. Today is {current_context['weekday']}.\n"
+        + "Input JSON:\n"
+        + payload_json
+        + _ANGLE_TAIL
     )
-    return call_gemini_json(model, prompt, temperature=0.6)
 
 
-def step_angle_generator(model, brief: Dict[str, Any], market_insights: Dict[str, Any]) -> Dict[str, Any]:
-    """Step 3 – Generate exactly 5 distinct creative angles with market intelligence."""
+def _market_angles_prompt(brief: Dict[str, Any]) -> str:
     current_context = get_current_context()
-    payload = {"brief": brief, "market_insights": market_insights.get("market_insights", {}), "current_context": current_context}
-    prompt = (
-        "Role: Creative Strategist\n"
-        "Task: Using the brief and market insights, propose exactly 5 distinct creative angles for ad campaigns.\n"
-        f"CURRENT TIMING CONTEXT: {current_context['context_note']}. Today is {current_context['weekday']}.\n"
-        "Input JSON:\n"
-        f"{json.dumps(payload, ensure_ascii=False)}\n"
-        "Output JSON schema (exactly 5):\n"
-        "{\n"
-        "  \"angles\": [\n"
-        "    {\n"
-        "      \"id\": \"1\"..\"5\",\n"
-        "      \"title\": string,\n"
-        "      \"insight\": string,\n"
-        "      \"key_message\": string,\n"
-        "      \"cultural_hook\": string,\n"
-        "      \"timing_consideration\": string\n"
-        "    }\n"
-        "  ]\n"
-        "}\n"
-        "Rules:\n"
-        "- Use the current date/season to create timely, relevant angles.\n"
-        "- Leverage market insights to create culturally resonant angles for Riyadh/KSA.\n"
-        "- Each angle must tap into what's happening NOW - current season, events, behaviors.\n"
-        "- Consider immediate timing opportunities (current weather, seasonal activities, cultural moments).\n"
-        "- Angles must be distinct and non-overlapping.\n"
-        "- Tailor to the audience and tone.\n"
-        "- Respond ONLY with minified JSON."
+    payload_json = (
+        f'{{"brief":{_fragment("brief", brief)},'
+        f'"current_context":{_fragment("context", current_context)}}}'
+    )
+    return (
+        _MARKET_ANGLES_HEAD
+        + f"IMPORTANT: {current_context['context_note']}. Today is {current_context['weekday']}. Current cultural events: {', '.join(current_context['cultural_events'])}.\n"
+        + "Input JSON:\n"
+        + payload_json
+        + _MARKET_ANGLES_TAIL
     )
-    return call_gemini_json(model, prompt, temperature=0.7)
+
+
+def _idea_writer_prompt(brief: Dict[str, Any], angles: Dict[str, Any]) -> str:
+    payload_json = (
+        f'{{"brief":{_slim_brief(brief)},'
+        f'"angles":{_fragment("angles", angles.get("angles", []))}}}'
+    )
+    return _IDEA_HEAD + payload_json + _IDEA_TAIL
+
+
+def _critic_improve_prompt(brief: Dict[str, Any], ideas: Dict[str, Any]) -> str:
+    payload_json = (
+        f'{{"brief":{_fragment("brief", brief)},'
+        f'"ideas":{_fragment("ideas", ideas.get("ideas", []))}}}'
+    )
+    return _CRITIC_HEAD + payload_json + _CRITIC_TAIL
+
+
+def _compliance_check_prompt(brief: Dict[str, Any], ideas: Dict[str, Any]) -> str:
+    payload_json = (
+        f'{{"brief":{_fragment("brief", brief)},'
+        f'"ideas":{_fragment("ideas", ideas.get("ideas", []))}}}'
+    )
+    return _COMPLIANCE_HEAD + payload_json + _COMPLIANCE_TAIL
+
+
+def _localize_polish_prompt(brief: Dict[str, Any], ideas: Dict[str, Any]) -> str:
+    payload_json = (
+        f'{{"language":{json.dumps(brief.get("language", "English"), ensure_ascii=False)},'
+        f'"tone":{json.dumps(brief.get("tone", ""), ensure_ascii=False)},'
+        f'"ideas":{_fragment("ideas", ideas.get("ideas", []))}}}'
+    )
+    return _LOCALIZE_HEAD + payload_json + _LOCALIZE_TAIL
+
+
+def _refine_all_prompt(brief: Dict[str, Any], ideas: Dict[str, Any]) -> str:
+    payload_json = (
+        f'{{"brief":{_slim_brief(brief)},'
+        f'"ideas":{_fragment("ideas", ideas.get("ideas", []))}}}'
+    )
+    return _REFINE_HEAD + payload_json + _REFINE_TAIL
+
+
+# -----------------------------
+# Sync steps (backwards compatible)
+# -----------------------------
+
+
+def step_brief_normalizer(
+    model,
+    product: str,
+    description: str,
+    audience: str,
+    tone: str,
+    language: str,
+) -> Dict[str, Any]:
+    """Step 1 – Normalize raw user inputs into a clean brief JSON."""
+    return call_gemini_json_cached(model, _brief_normalizer_prompt(product, description, audience, tone, language), temperature=0.4, _response_schema=Brief, schema_key="Brief")
+
+
+def step_market_intelligence(model, brief: Dict[str, Any]) -> Dict[str, Any]:
+    """Step 2 – Generate KSA market insights and competitive landscape.
+
+    Deprecated: step_market_angles fuses steps 2–3 into one call.
+    """
+    return call_gemini_json_cached(model, _market_intelligence_prompt(brief), temperature=0.6, _response_schema=MarketIntelligence, schema_key="MarketIntelligence")
+
+
+def step_angle_generator(model, brief: Dict[str, Any], market_insights: Dict[str, Any]) -> Dict[str, Any]:
+    """Step 3 – Generate exactly 5 distinct creative angles with market intelligence.
+
+    Deprecated: step_market_angles fuses steps 2–3 into one call.
+    """
+    return call_gemini_json(model, _angle_generator_prompt(brief, market_insights), temperature=0.7, response_schema=AngleSet)
+
+
+def step_market_angles(model, brief: Dict[str, Any]) -> Dict[str, Any]:
+    """Step 2 – KSA market insights plus 5 creative angles in one Gemini call.
+
+    Fuses the former market-intelligence and angle-generator steps (2–3):
+    the angles were the only consumer of the insights, so producing both in
+    one response saves a round-trip and keeps the normalized brief as the
+    input for both. Uncached because the angles are creative output.
+    """
+    return call_gemini_json(model, _market_angles_prompt(brief), temperature=0.7, response_schema=MarketAngles)
 
 
 def step_idea_writer(
@@ -123,33 +567,7 @@ def step_idea_writer(
     angles: Dict[str, Any],
 ) -> Dict[str, Any]:
     """Step 4 – Write 3 detailed campaign ideas (A, B, C)."""
-    payload = {"brief": brief, "angles": angles.get("angles", [])}
-    prompt = (
-        "Role: Idea Writer\n"
-        "Task: Using the brief and angles, write exactly 3 campaign ideas (A, B, C) with required fields.\n"
-        "Input JSON:\n"
-        f"{json.dumps(payload, ensure_ascii=False)}\n"
-        "Output JSON schema (exactly 3):\n"
-        "{\n"
-        "  \"ideas\": [\n"
-        "    {\n"
-        "      \"label\": \"A\"|\"B\"|\"C\",\n"
-        "      \"based_on_angle_id\": \"1\"..\"5\",\n"
-        "      \"tagline\": string,\n"
-        "      \"script_30s\": string,\n"
-        "      \"captions\": { \"instagram\": string, \"x\": string },\n"
-        "      \"cta\": string\n"
-        "    }\n"
-        "  ]\n"
-        "}\n"
-        "Constraints:\n"
-        "- Scripts and captions must be culturally and locally relevant for the Riyadh, Saudi Arabia (KSA) market unless a different audience is specified.\n"
-        "- Longer narrative: ~130–170 words (about 40s), with a clear beginning, middle, and end.\n"
-        "- Captions are punchy; no hashtags unless essential.\n"
-        "- Align with tone and audience.\n"
-        "- Respond ONLY with minified JSON."
-    )
-    return call_gemini_json(model, prompt, temperature=0.85)
+    return call_gemini_json(model, _idea_writer_prompt(brief, angles), temperature=0.85, response_schema=IdeaSet)
 
 
 def step_critic_improve(
@@ -157,66 +575,19 @@ def step_critic_improve(
     brief: Dict[str, Any],
     ideas: Dict[str, Any],
 ) -> Dict[str, Any]:
-    """Step 5 – Critique and revise weak ideas; output only improved versions."""
-    payload = {"brief": brief, "ideas": ideas.get("ideas", [])}
-    prompt = (
-        "Role: Critic & Improve\n"
-        "Task: Review the ideas, identify weaknesses, and revise them. Output only the improved versions.\n"
-        "Input JSON:\n"
-        f"{json.dumps(payload, ensure_ascii=False)}\n"
-        "Output JSON schema:\n"
-        "{\n"
-        "  \"ideas\": [\n"
-        "    {\n"
-        "      \"label\": \"A\"|\"B\"|\"C\",\n"
-        "      \"based_on_angle_id\": \"1\"..\"5\",\n"
-        "      \"tagline\": string,\n"
-        "      \"script_30s\": string,\n"
-        "      \"captions\": { \"instagram\": string, \"x\": string },\n"
-        "      \"cta\": string\n"
-        "    }\n"
-        "  ]\n"
-        "}\n"
-        "Rules:\n"
-        "- Review for cultural appropriateness for the Riyadh/KSA market. Revise any idea that might not land well.\n"
-        "- Keep original strengths; fix clarity, hook, and CTA strength.\n"
-        "- Ensure each idea is distinct; remove redundancy.\n"
-        "- Respond ONLY with minified JSON."
-    )
-    return call_gemini_json(model, prompt, temperature=0.6)
+    """Step 5 – Critique and revise weak ideas; output only improved versions.
+
+    Deprecated: step_refine_all fuses steps 5–7 into one call.
+    """
+    return call_gemini_json(model, _critic_improve_prompt(brief, ideas), temperature=0.6, response_schema=IdeaSet)
 
 
 def step_compliance_check(model, brief: Dict[str, Any], ideas: Dict[str, Any]) -> Dict[str, Any]:
-    """Step 6 – Verify adherence to KSA advertising guidelines and cultural appropriateness."""
-    payload = {"brief": brief, "ideas": ideas.get("ideas", [])}
-    prompt = (
-        "Role: Compliance & Cultural Reviewer\n"
-        "Task: Review campaign ideas for compliance with KSA advertising guidelines and cultural appropriateness.\n"
-        "Input JSON:\n"
-        f"{json.dumps(payload, ensure_ascii=False)}\n"
-        "Output JSON schema:\n"
-        "{\n"
-        "  \"ideas\": [\n"
-        "    {\n"
-        "      \"label\": \"A\"|\"B\"|\"C\",\n"
-        "      \"based_on_angle_id\": \"1\"..\"5\",\n"
-        "      \"tagline\": string,\n"
-        "      \"script_30s\": string,\n"
-        "      \"captions\": { \"instagram\": string, \"x\": string },\n"
-        "      \"cta\": string,\n"
-        "      \"compliance_notes\": string\n"
-        "    }\n"
-        "  ]\n"
-        "}\n"
-        "Rules:\n"
-        "- Ensure compliance with Saudi Arabia advertising regulations and cultural sensitivities.\n"
-        "- Check for appropriate representation, modest imagery suggestions, respectful tone.\n"
-        "- Verify timing considerations (prayer times, cultural events, weekends).\n"
-        "- Remove or revise any potentially problematic content.\n"
-        "- Add brief compliance notes explaining any changes made.\n"
-        "- Respond ONLY with minified JSON."
-    )
-    return call_gemini_json(model, prompt, temperature=0.4)
+    """Step 6 – Verify adherence to KSA advertising guidelines and cultural appropriateness.
+
+    Deprecated: step_refine_all fuses steps 5–7 into one call.
+    """
+    return call_gemini_json(model, _compliance_check_prompt(brief, ideas), temperature=0.4, response_schema=ReviewedIdeaSet)
 
 
 def step_localize_polish(
@@ -224,76 +595,206 @@ def step_localize_polish(
     brief: Dict[str, Any],
     ideas: Dict[str, Any],
 ) -> Dict[str, Any]:
-    """Step 7 – Final refinement to requested language & tone."""
-    payload = {
-        "language": brief.get("language", "English"),
-        "tone": brief.get("tone", ""),
-        "ideas": ideas.get("ideas", []),
-    }
-    prompt = (
-        "Role: Localize/Polish\n"
-        "Task: Refine the ideas to the requested language and tone. If the language is Arabic, fully localize the content to natural Modern Standard Arabic. If the language is English, just polish the existing English text for clarity and impact.\n"
-        "Style Guide (apply strictly):\n"
-        "- Use a friendly, conversational second-person voice (\"you\").\n"
-        "- Prefer short sentences (8–15 words) and simple everyday words.\n"
-        "- Open scripts with a concrete moment or scenario (e.g., \"Imagine...\", \"It's 2 PM in Riyadh...\").\n"
-        "- Show, not tell: add 1–2 light sensory cues without hype.\n"
-        "- Keep scripts ~120–160 words, split into 3–5 short paragraphs.\n"
-        "- Captions: IG slightly expressive; X concise and punchy. Avoid unnecessary hashtags.\n"
-        "- Do not invent product claims; no health/functional promises.\n"
-        "Input JSON:\n"
-        f"{json.dumps(payload, ensure_ascii=False)}\n"
-        "Output JSON schema (same as input ideas schema):\n"
-        "{\n"
-        "  \"ideas\": [\n"
-        "    {\n"
-        "      \"label\": \"A\"|\"B\"|\"C\",\n"
-        "      \"based_on_angle_id\": \"1\"..\"5\",\n"
-        "      \"tagline\": string,\n"
-        "      \"script_30s\": string,\n"
-        "      \"captions\": { \"instagram\": string, \"x\": string },\n"
-        "      \"cta\": string\n"
-        "    }\n"
-        "  ]\n"
-        "}\n"
-        "Rules:\n"
-        "- Perform a final cultural polish to ensure content is appropriate and effective for the target market (defaulting to Riyadh, KSA).\n"
-        "- Preserve meaning while adjusting tone.\n"
-        "- For Arabic, use proper Modern Standard Arabic, not transliteration.\n"
-        "- For English, focus on polishing grammar, style, and flow.\n"
-        "- Respond ONLY with minified JSON."
-    )
-    return call_gemini_json(model, prompt, temperature=0.5)
+    """Step 7 – Final refinement to requested language & tone.
 
+    Deprecated: step_refine_all fuses steps 5–7 into one call.
+    """
+    return call_gemini_json(model, _localize_polish_prompt(brief, ideas), temperature=0.5, response_schema=IdeaSet)
 
-def step_final_presenter(ideas: List[Dict[str, Any]]) -> str:
-    """Render final Markdown from ideas JSON. No JSON is shown to the user."""
+
+def step_refine_all(model, brief: Dict[str, Any], ideas: Dict[str, Any]) -> Dict[str, Any]:
+    """Step 5 – Critique, compliance-check, and localize the ideas in one Gemini call.
+
+    Fuses the former critic/compliance/localize steps (5–7), cutting three
+    round-trips to one and sending the ideas payload only once.
+    """
+    return call_gemini_json(model, _refine_all_prompt(brief, ideas), temperature=0.5, response_schema=ReviewedIdeaSet)
+
+
+# -----------------------------
+# Async steps
+# -----------------------------
+
+
+async def step_brief_normalizer_async(
+    model,
+    product: str,
+    description: str,
+    audience: str,
+    tone: str,
+    language: str,
+    on_chunk: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Any]:
+    """Async variant of step_brief_normalizer."""
+    return await call_gemini_json_async(model, _brief_normalizer_prompt(product, description, audience, tone, language), temperature=0.4, on_chunk=on_chunk, response_schema=Brief)
+
+
+async def step_market_intelligence_async(model, brief: Dict[str, Any], on_chunk: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """Async variant of step_market_intelligence."""
+    return await call_gemini_json_async(model, _market_intelligence_prompt(brief), temperature=0.6, on_chunk=on_chunk, response_schema=MarketIntelligence)
+
+
+async def step_market_angles_async(model, brief: Dict[str, Any], on_chunk: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """Async variant of step_market_angles."""
+    return await call_gemini_json_async(model, _market_angles_prompt(brief), temperature=0.7, on_chunk=on_chunk, response_schema=MarketAngles)
+
+
+async def step_angle_generator_async(model, brief: Dict[str, Any], market_insights: Dict[str, Any], on_chunk: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """Async variant of step_angle_generator."""
+    return await call_gemini_json_async(model, _angle_generator_prompt(brief, market_insights), temperature=0.7, on_chunk=on_chunk, response_schema=AngleSet)
+
+
+async def step_idea_writer_async(model, brief: Dict[str, Any], angles: Dict[str, Any], on_chunk: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """Async variant of step_idea_writer."""
+    return await call_gemini_json_async(model, _idea_writer_prompt(brief, angles), temperature=0.85, on_chunk=on_chunk, response_schema=IdeaSet)
+
+
+async def step_critic_improve_async(model, brief: Dict[str, Any], ideas: Dict[str, Any], on_chunk: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """Async variant of step_critic_improve."""
+    return await call_gemini_json_async(model, _critic_improve_prompt(brief, ideas), temperature=0.6, on_chunk=on_chunk, response_schema=IdeaSet)
+
+
+async def step_compliance_check_async(model, brief: Dict[str, Any], ideas: Dict[str, Any], on_chunk: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """Async variant of step_compliance_check."""
+    return await call_gemini_json_async(model, _compliance_check_prompt(brief, ideas), temperature=0.4, on_chunk=on_chunk, response_schema=ReviewedIdeaSet)
+
+
+async def step_localize_polish_async(model, brief: Dict[str, Any], ideas: Dict[str, Any], on_chunk: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """Async variant of step_localize_polish."""
+    return await call_gemini_json_async(model, _localize_polish_prompt(brief, ideas), temperature=0.5, on_chunk=on_chunk, response_schema=IdeaSet)
+
+
+async def step_refine_all_async(
+    model,
+    brief: Dict[str, Any],
+    ideas: Dict[str, Any],
+    on_chunk: Optional[Callable[[int], None]] = None,
+    on_text: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """Async variant of step_refine_all.
+
+    on_text receives each response chunk as it arrives; feed the chunks to an
+    IdeaStreamScanner to render each idea as soon as its JSON object closes
+    in the stream, before the call finishes.
+    """
+    return await call_gemini_json_async(model, _refine_all_prompt(brief, ideas), temperature=0.5, on_chunk=on_chunk, response_schema=ReviewedIdeaSet, on_text=on_text)
+
+
+class IdeaStreamScanner:
+    """Incrementally extract completed idea objects from a streamed response.
+
+    feed() consumes each chunk exactly once, carrying the brace/string scan
+    position across calls, so total scan work is linear in the response
+    rather than rescanning the accumulated text per chunk. Objects in the
+    "ideas" array are parsed and returned as they close, letting a caller
+    render idea A while the model is still writing B and C.
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._start = -1
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume one chunk; return any idea objects it completed."""
+        if self._done:
+            return []
+        self._text += chunk
+        if not self._in_array:
+            key = self._text.find('"ideas"')
+            if key == -1:
+                return []
+            i = self._text.find("[", key)
+            if i == -1:
+                return []
+            self._in_array = True
+            self._pos = i + 1
+        ideas: List[Dict[str, Any]] = []
+        i = self._pos
+        n = len(self._text)
+        while i < n:
+            ch = self._text[i]
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._start = i
+                elif ch == "]":
+                    self._done = True
+                    break
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        ideas.append(json.loads(self._text[self._start:i + 1]))
+                    except ValueError:
+                        self._done = True
+                        break
+            i += 1
+        self._pos = i
+        return ideas
+
+
+def _ordered_ideas(ideas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     # Expect labels A, B, C
     by_label = {idea.get("label", "").upper(): idea for idea in ideas}
     ordered = [by_label.get("A"), by_label.get("B"), by_label.get("C")]
-    ordered = [i for i in ordered if i]
-
-    sections = []
-    for idea in ordered:
-        label = idea.get("label", "").upper()
-        tagline = idea.get("tagline", "").strip()
-        script_30s = idea.get("script_30s", "").strip()
-        captions = idea.get("captions", {}) or {}
-        ig = captions.get("instagram", "").strip()
-        xcap = captions.get("x", "").strip()
-        cta = idea.get("cta", "").strip()
-
-        # Show compliance notes if available (for transparency)
-        compliance_notes = idea.get("compliance_notes", "").strip()
-        compliance_section = f"\n\n*Compliance Notes: {compliance_notes}*" if compliance_notes else ""
-
-        section = (
-            f"### Option {label}\n"
-            f"#### {tagline}\n\n"
-            f"> {script_30s}\n\n"
-            f"**Captions**\n- **IG**: {ig}\n- **X**: {xcap}\n\n"
-            f"**CTA**: {cta}{compliance_section}\n"
-        )
-        sections.append(section)
-
-    return "\n\n".join(sections)
+    return [i for i in ordered if i]
+
+
+def _idea_parts(idea: Dict[str, Any]) -> List[str]:
+    """Flat markdown string parts for one idea section."""
+    label = idea.get("label", "").upper()
+    tagline = idea.get("tagline", "").strip()
+    script_30s = idea.get("script_30s", "").strip()
+    captions = idea.get("captions", {}) or {}
+    ig = captions.get("instagram", "").strip()
+    xcap = captions.get("x", "").strip()
+    cta = idea.get("cta", "").strip()
+
+    parts = [
+        "### Option ", label, "\n",
+        "#### ", tagline, "\n\n",
+        "> ", script_30s, "\n\n",
+        "**Captions**\n- **IG**: ", ig, "\n- **X**: ", xcap, "\n\n",
+        "**CTA**: ", cta,
+    ]
+
+    # Show compliance notes if available (for transparency)
+    compliance_notes = idea.get("compliance_notes", "").strip()
+    if compliance_notes:
+        parts.extend(("\n\n*Compliance Notes: ", compliance_notes, "*"))
+    parts.append("\n")
+    return parts
+
+
+def present_idea(idea: Dict[str, Any]) -> str:
+    """Markdown for a single idea section (used for streamed rendering)."""
+    return "".join(_idea_parts(idea))
+
+
+def step_final_presenter(ideas: List[Dict[str, Any]]) -> str:
+    """Render final Markdown from ideas JSON. No JSON is shown to the user."""
+    # Collect flat string parts and join once at the end, instead of building
+    # an intermediate f-string per section and joining those.
+    parts: List[str] = []
+    for idea in _ordered_ideas(ideas):
+        if parts:
+            parts.append("\n\n")
+        parts.extend(_idea_parts(idea))
+    return "".join(parts)
@@ -1,10 +1,12 @@
 
+import asyncio
+import functools
 import json
 import os
-import re
-from datetime import datetime
-from typing import Any, Dict
-import pytz
+import threading
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Optional
 
 import streamlit as st
 import google.generativeai as genai
@@ -13,29 +15,44 @@ import google.generativeai as genai
 SYSTEM_MESSAGE = "Think privately but never reveal reasoning. Output only JSON or final formatted text."
 DEFAULT_AUDIENCE = "People in Riyadh, Saudi Arabia"
 
-# KSA Cultural Calendar
-CULTURAL_EVENTS = {
-    1: ["New Year period", "Winter shopping season"],
-    2: ["Valentine's season", "Winter activities"],
-    3: ["Spring season begins", "Outdoor activities increase"],
-    4: ["Spring weather", "Ramadan season (varies yearly)"],
-    5: ["End of school year approaching", "Eid preparations (varies)"],
-    6: ["Summer vacation begins", "Travel season"],
-    7: ["Peak summer", "Indoor activities focus"],
-    8: ["Back-to-school preparations", "Summer sales"],
-    9: ["School year begins", "Autumn preparations"],
-    10: ["Mild weather returns", "Outdoor events resume"],
-    11: ["Pleasant weather", "National Day season (Sept 23rd nearby)"],
-    12: ["Winter season", "Year-end shopping", "Holiday preparations"],
-}
+# KSA Cultural Calendar. Tuples and a read-only mapping: the table is shared
+# by every cached context snapshot, so nothing should be able to mutate it.
+CULTURAL_EVENTS = MappingProxyType({
+    1: ("New Year period", "Winter shopping season"),
+    2: ("Valentine's season", "Winter activities"),
+    3: ("Spring season begins", "Outdoor activities increase"),
+    4: ("Spring weather", "Ramadan season (varies yearly)"),
+    5: ("End of school year approaching", "Eid preparations (varies)"),
+    6: ("Summer vacation begins", "Travel season"),
+    7: ("Peak summer", "Indoor activities focus"),
+    8: ("Back-to-school preparations", "Summer sales"),
+    9: ("School year begins", "Autumn preparations"),
+    10: ("Mild weather returns", "Outdoor events resume"),
+    11: ("Pleasant weather", "National Day season (Sept 23rd nearby)"),
+    12: ("Winter season", "Year-end shopping", "Holiday preparations"),
+})
 
 
-def get_current_context() -> Dict[str, Any]:
-    """Get current date, season, and cultural context for KSA market."""
-    # Use KSA timezone (UTC+3)
-    ksa_tz = pytz.timezone('Asia/Riyadh')
-    now = datetime.now(ksa_tz)
-    
+@functools.lru_cache(maxsize=1)
+def _ksa_tz():
+    """Resolve the KSA timezone (UTC+3) lazily on first use.
+
+    Prefers the stdlib zoneinfo (no third-party import at startup); falls back
+    to pytz where the system tz database is unavailable.
+    """
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo('Asia/Riyadh')
+    except Exception:
+        import pytz
+        return pytz.timezone('Asia/Riyadh')
+
+
+@functools.lru_cache(maxsize=8)
+def _compute_context(date_key: str) -> Dict[str, Any]:
+    """Build the context dict for a given KSA calendar date (cached per day)."""
+    now = datetime.now(_ksa_tz())
+
     # Basic date info
     current_month = now.strftime("%B")
     current_year = now.year
@@ -53,14 +70,14 @@ def get_current_context() -> Dict[str, Any]:
         season = "Autumn"
     
     # Cultural events
-    cultural_events = CULTURAL_EVENTS.get(month, [])
+    cultural_events = CULTURAL_EVENTS.get(month, ())
     
     # Weekend context (KSA weekend is Friday-Saturday)
     weekday = now.strftime("%A")
     is_weekend = weekday in ["Friday", "Saturday"]
     
     return {
-        "current_date": now.strftime("%Y-%m-%d"),
+        "current_date": date_key,
         "current_month": current_month,
         "current_year": current_year,
         "season": season,
@@ -71,6 +88,29 @@ def get_current_context() -> Dict[str, Any]:
     }
 
 
+def get_current_context() -> Dict[str, Any]:
+    """Get current date, season, and cultural context for KSA market.
+
+    Called several times per submit (app banner, market intelligence, angle
+    generator); memoized on the KSA calendar date so every step sees one
+    consistent snapshot without redoing timezone/strftime work, and stashed in
+    session_state to skip even the cache lookup within a run.
+    """
+    date_key = datetime.now(_ksa_tz()).strftime("%Y-%m-%d")
+    try:
+        ctx = st.session_state.get("ctx")
+        if ctx and ctx.get("current_date") == date_key:
+            return ctx
+    except Exception:
+        ctx = None
+    ctx = _compute_context(date_key)
+    try:
+        st.session_state["ctx"] = ctx
+    except Exception:
+        pass
+    return ctx
+
+
 def get_api_key() -> str:
     """Fetch Gemini API key from Streamlit Secrets or environment variables."""
     key = None
@@ -88,19 +128,158 @@ def get_api_key() -> str:
     return key or ""
 
 
-def init_genai(api_key: str) -> None:
-    """Initialize the Google Generative AI client."""
-    genai.configure(api_key=api_key)
-
+@st.cache_resource(show_spinner=False)
+def create_model(api_key: str, model_name: str = "gemini-1.5-flash"):
+    """Configure the client and create a GenerativeModel, cached per (api_key, model_name).
 
-def create_model(model_name: str = "gemini-1.5-flash"):
-    """Create a GenerativeModel with the required system instruction."""
+    Streamlit reruns the whole script on every form submit; caching here means the
+    SDK is configured and the model object built once per session, not per click.
+    """
+    genai.configure(api_key=api_key)
     return genai.GenerativeModel(
         model_name=model_name,
         system_instruction=SYSTEM_MESSAGE,
     )
 
 
+def _shared_prefix() -> str:
+    """Build the invariant prefix every chain step would otherwise re-send."""
+    context = get_current_context()
+    return (
+        "Shared context for all steps of the creative chain.\n"
+        f"{context['context_note']}. Today is {context['weekday']}.\n"
+        f"Current cultural events: {', '.join(context['cultural_events'])}.\n"
+        "Default target market: Riyadh, Saudi Arabia (KSA).\n"
+        "Every step responds ONLY with minified JSON."
+    )
+
+
+# Server-side context caching has a minimum cacheable size (~32k tokens on
+# gemini-1.5-flash); CachedContent.create rejects anything smaller, so don't
+# spend a blocking API round-trip finding that out.
+_MIN_CACHE_TOKENS = 32768
+_CONTENT_TTL = timedelta(hours=1)
+
+
+def _content_cacheable(text: str) -> bool:
+    # ~4 chars per token heuristic
+    return len(text) // 4 >= _MIN_CACHE_TOKENS
+
+
+@st.cache_resource(show_spinner=False, ttl=_CONTENT_TTL)
+def get_cached_model(api_key: str, model_name: str = "gemini-1.5-flash", date_key: str = ""):
+    """Create a model backed by server-side context caching of the shared prefix.
+
+    Gemini's context caching lets repeated prefix tokens (system instruction +
+    KSA context blob) be processed once and referenced by every step, cutting
+    prefill time and input-token cost across the chain. Keyed by date_key so a
+    fresh cache is built when the KSA calendar date rolls over, and the
+    resource-cache TTL matches the CachedContent TTL so a model can never
+    outlive the server-side cache it is bound to. Today's shared prefix is far
+    below the cacheable minimum, so the helper falls back to a plain model
+    without attempting the create; the path activates once the prefix grows
+    past _MIN_CACHE_TOKENS.
+    """
+    genai.configure(api_key=api_key)
+    prefix = _shared_prefix()
+    if not _content_cacheable(prefix):
+        return create_model(api_key, model_name)
+    try:
+        cache = genai.caching.CachedContent.create(
+            model=model_name,
+            system_instruction=SYSTEM_MESSAGE,
+            contents=[prefix],
+            ttl=_CONTENT_TTL,
+        )
+        return genai.GenerativeModel.from_cached_content(cached_content=cache)
+    except Exception:
+        return create_model(api_key, model_name)
+
+
+@st.cache_resource(show_spinner=False)
+def warm_gemini_connection(api_key: str, model_name: str = "gemini-1.5-flash") -> bool:
+    """Open the HTTPS connection to the Gemini API in the background.
+
+    Fired once per session while the user is still filling in the form, so
+    the first real call skips DNS/TCP/TLS setup. Uses a tiny count_tokens
+    request (no generation cost); failures are ignored — this is purely a
+    warm-up.
+    """
+    def _ping() -> None:
+        try:
+            create_model(api_key, model_name).count_tokens("ping")
+        except Exception:
+            pass
+
+    threading.Thread(target=_ping, daemon=True).start()
+    return True
+
+
+# google-generativeai's async client caches a grpc.aio transport whose channel
+# is bound to the event loop it first runs on. Spinning up a fresh loop per
+# asyncio.run would leave that cached channel pointing at a closed loop, and
+# every async call after the first would die with "Event loop is closed" — so
+# all generate_content_async work runs on one process-wide loop that lives in
+# a daemon thread for the life of the process.
+_ASYNC_LOOP_LOCK = threading.Lock()
+_ASYNC_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _async_loop() -> asyncio.AbstractEventLoop:
+    global _ASYNC_LOOP
+    with _ASYNC_LOOP_LOCK:
+        if _ASYNC_LOOP is None or _ASYNC_LOOP.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, daemon=True).start()
+            _ASYNC_LOOP = loop
+    return _ASYNC_LOOP
+
+
+def run_async(coro):
+    """Run a coroutine on the shared Gemini event loop and block for its result.
+
+    The only supported entry point for the async steps — a per-call
+    asyncio.run would break the SDK's loop-bound grpc channel (see
+    _async_loop). Safe to call from any thread, including Streamlit's
+    script thread and worker threads.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _async_loop()).result()
+
+
+def _extract_json_object(text: str) -> str:
+    """Scan for the first balanced {...} block in a single pass.
+
+    String- and escape-aware, so braces inside JSON string values do not
+    confuse the depth count. Handles fenced ```json blocks for free, since
+    the scan starts at the first '{' wherever it appears. Returns "" when no
+    balanced object is found.
+    """
+    start = text.find("{")
+    if start == -1:
+        return ""
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return ""
+
+
 def parse_json_str(text: str) -> Dict[str, Any]:
     """Robustly parse a JSON string returned by the model."""
     text = text.strip()
@@ -110,19 +289,10 @@ def parse_json_str(text: str) -> Dict[str, Any]:
     except Exception:
         pass
 
-    # Try fenced blocks ```json ... ``` or ``` ... ```
-    fence_match = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text, re.IGNORECASE)
-    if fence_match:
-        candidate = fence_match.group(1).strip()
-        try:
-            return json.loads(candidate)
-        except Exception:
-            pass
-
-    # Try extracting the first {...} block
-    obj_match = re.search(r"\{[\s\S]*\}", text)
-    if obj_match:
-        candidate = obj_match.group(0)
+    # Fall back to extracting the first balanced {...} block (covers fenced
+    # ```json blocks and leading/trailing prose) without regex backtracking.
+    candidate = _extract_json_object(text)
+    if candidate:
         try:
             return json.loads(candidate)
         except Exception:
@@ -131,14 +301,120 @@ def parse_json_str(text: str) -> Dict[str, Any]:
     raise ValueError("Model did not return valid JSON.")
 
 
-def call_gemini_json(model, prompt: str, temperature: float = 0.7) -> Dict[str, Any]:
-    """Call Gemini with JSON-only response enforced and return parsed dict."""
+def _parse_schema_json(text: str) -> Dict[str, Any]:
+    """Parse schema-constrained output with the same clear error as parse_json_str.
+
+    Schema-constrained responses are valid JSON by construction, but a
+    safety-blocked or truncated candidate yields empty/partial text — without
+    this guard the user would see json.loads's raw "Expecting value" message.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise ValueError("Model did not return valid JSON.")
+
+
+def _generation_config(temperature: float, response_schema=None) -> Dict[str, Any]:
+    config: Dict[str, Any] = {
+        "temperature": temperature,
+        "response_mime_type": "application/json",
+    }
+    if response_schema is not None:
+        config["response_schema"] = response_schema
+    return config
+
+
+def call_gemini_json(model, prompt: str, temperature: float = 0.7, response_schema=None) -> Dict[str, Any]:
+    """Call Gemini with JSON-only response enforced and return parsed dict.
+
+    When response_schema is given (a TypedDict describing the step output),
+    the API constrains decoding to that schema, so the text is valid JSON by
+    construction and a plain json.loads replaces the defensive extraction.
+    """
     response = model.generate_content(
         prompt,
-        generation_config={
-            "temperature": temperature,
-            "response_mime_type": "application/json",
-        },
+        generation_config=_generation_config(temperature, response_schema),
     )
     text = getattr(response, "text", None) or ""
+    if response_schema is not None:
+        return _parse_schema_json(text)
+    return parse_json_str(text)
+
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def call_gemini_json_cached(_model, prompt: str, temperature: float = 0.7, _response_schema=None, schema_key: str = "") -> Dict[str, Any]:
+    """Memoized call_gemini_json, keyed by (prompt, temperature, schema_key).
+
+    Reserved for the low-temperature, deterministic-enough steps (brief
+    normalizer, market intelligence); the creative steps must stay uncached
+    so regenerating the same brief can produce new variations. The prompt
+    embeds every input a step depends on. schema_key names the response
+    schema — the TypedDict class itself is not hashable by Streamlit, so
+    callers pass its name to keep differently-shaped outputs apart. The
+    model argument is underscore-prefixed so Streamlit skips hashing it.
+    """
+    return call_gemini_json(_model, prompt, temperature, _response_schema)
+
+
+async def call_gemini_json_async(
+    model,
+    prompt: str,
+    temperature: float = 0.7,
+    on_chunk: Optional[Callable[[int], None]] = None,
+    response_schema=None,
+    on_text: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """Async variant of call_gemini_json that streams the response.
+
+    Chunks are consumed as they arrive so network transfer overlaps parsing
+    and UI updates: on_chunk (if given) is called with the number of
+    characters received so far, on_text (if given) with each chunk's text
+    exactly once — callers that parse objects out of the stream keep their
+    own incremental state (see chain.IdeaStreamScanner) so per-chunk work
+    stays proportional to the chunk — and a running brace-balance scan lets
+    the call return as soon as the top-level JSON object closes rather than
+    waiting for the stream to finish.
+    """
+    response = await model.generate_content_async(
+        prompt,
+        generation_config=_generation_config(temperature, response_schema),
+        stream=True,
+    )
+    parts = []
+    received = 0
+    depth = 0
+    in_string = False
+    escaped = False
+    started = False
+    async for chunk in response:
+        piece = getattr(chunk, "text", None) or ""
+        if not piece:
+            continue
+        parts.append(piece)
+        received += len(piece)
+        if on_chunk:
+            on_chunk(received)
+        if on_text:
+            on_text(piece)
+        # Incremental continuation of the _extract_json_object scan.
+        for ch in piece:
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == "{":
+                depth += 1
+                started = True
+            elif ch == "}":
+                depth -= 1
+        if started and depth == 0:
+            break
+    text = "".join(parts)
+    if response_schema is not None:
+        return _parse_schema_json(text.strip())
     return parse_json_str(text)